@@ -1,4 +1,9 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Header, Depends, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+import hmac
+import os
 import time
 import cv2
 import numpy as np
@@ -6,25 +11,46 @@ import numpy as np
 from app.services.ocr_service import OCRService
 from app.services.pharma_service import PharmaService
 from app.services.verification_service import VerificationService
-from app.models.schemas import APIResponse, ErrorResponse
+from app.services.stream_service import StreamSession
+from app.models.schemas import APIResponse, ErrorResponse, ProfilerConfig
+from app.utils.profiler import SamplingProfiler
 
 router = APIRouter()
 
 ocr = OCRService()
 pharma = PharmaService()
 verifier = VerificationService()
+profiler = SamplingProfiler(sample_every=int(os.getenv('PROFILE_SAMPLE_EVERY','0')))
+
+def _is_admin(token: Optional[str]) -> bool:
+    expected=os.getenv('ADMIN_TOKEN','')
+    return bool(expected) and hmac.compare_digest(token or '', expected)
+
+def require_admin(x_admin_token: Optional[str]=Header(None)):
+    if not _is_admin(x_admin_token):
+        raise HTTPException(403,"Admin token required")
 
 @router.post("/verify", response_model=APIResponse, responses={400:{'model':ErrorResponse}})
-async def verify_medicine(image: UploadFile=File(...)):
+async def verify_medicine(response: Response, image: UploadFile=File(...),
+                          x_profile: Optional[str]=Header(None),
+                          x_admin_token: Optional[str]=Header(None)):
     start=time.time()
-    img_bytes=await image.read()
-    nparr=np.frombuffer(img_bytes,np.uint8)
-    img=cv2.imdecode(nparr,cv2.IMREAD_COLOR)
-    if img is None:
-        raise HTTPException(400,"Invalid image")
-    ocr_res=await ocr.extract_text(img)
-    extracted=pharma.extract_info(ocr_res['text'])
-    ver_res=await verifier.verify(extracted)
+    profile_id=None
+    if (x_profile and _is_admin(x_admin_token)) or profiler.should_sample():
+        profile_id=profiler.start()
+        response.headers['X-Profile-Id']=profile_id
+    try:
+        img_bytes=await image.read()
+        nparr=np.frombuffer(img_bytes,np.uint8)
+        img=cv2.imdecode(nparr,cv2.IMREAD_COLOR)
+        if img is None:
+            raise HTTPException(400,"Invalid image")
+        ocr_res=await ocr.extract_text(img)
+        extracted=pharma.extract_info(ocr_res['text'])
+        ver_res=await verifier.verify(extracted)
+    finally:
+        if profile_id:
+            profiler.stop(profile_id)
     duration=time.time()-start
     return APIResponse(
         processing_time=duration,
@@ -34,3 +60,66 @@ async def verify_medicine(image: UploadFile=File(...)):
         verification_result=ver_res,
         recommendations=[]
     )
+
+@router.websocket("/stream")
+async def stream_verify(websocket: WebSocket):
+    """Verify from a live camera stream: send encoded frames as binary messages,
+    receive per-frame acks and a result whenever verification changes or settles."""
+    await websocket.accept()
+    session=StreamSession(ocr, pharma, verifier)
+    send_lock=asyncio.Lock()
+
+    async def send(message):
+        async with send_lock:
+            await websocket.send_text(message.model_dump_json())
+
+    async def process():
+        while True:
+            update=await session.next_update()
+            if update is not None:
+                await send(update)
+
+    worker=asyncio.create_task(process())
+    try:
+        while True:
+            data=await websocket.receive_bytes()
+            await send(await session.submit(data))
+            if worker.done():
+                worker.result()  # surface processing errors
+    except WebSocketDisconnect:
+        pass
+    finally:
+        worker.cancel()
+
+@router.get("/sources/health")
+async def sources_health():
+    return verifier.db.health_snapshot()
+
+@router.get("/admin/profiler", dependencies=[Depends(require_admin)])
+async def profiler_status():
+    return profiler.status()
+
+@router.put("/admin/profiler", dependencies=[Depends(require_admin)])
+async def configure_profiler(config: ProfilerConfig):
+    profiler.configure(config.sample_every, config.interval_ms/1000 if config.interval_ms else None)
+    return profiler.status()
+
+@router.get("/admin/profiler/stacks", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def download_stacks():
+    return PlainTextResponse(profiler.collapsed(),
+        headers={'Content-Disposition':'attachment; filename="verify.collapsed"'})
+
+@router.delete("/admin/profiler/stacks", dependencies=[Depends(require_admin)])
+async def reset_stacks():
+    profiler.reset()
+    return profiler.status()
+
+@router.get("/admin/profiler/requests/{profile_id}", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def download_request_stacks(profile_id: str):
+    """Stacks of one profiled request: its own coroutine chain on the event loop
+    plus the worker threads that ran its OCR stages"""
+    stacks=profiler.collapsed(profile_id)
+    if stacks is None:
+        raise HTTPException(404,"Unknown profile id")
+    return PlainTextResponse(stacks,
+        headers={'Content-Disposition':f'attachment; filename="{profile_id}.collapsed"'})
@@ -0,0 +1,226 @@
+"""Offline batch reprocessing of archived scans.
+
+Streams label images (and stored OCR texts, as ``.txt``) from a directory or
+a tar archive, then runs decode, OCR, ``PharmaService.extract_info`` and
+verification across a process pool. Results are appended to a JSON-lines
+file that doubles as the checkpoint: re-running the same command skips every
+item already processed successfully and retries the ones that failed.
+
+A retried item is appended again, so the output can hold several records
+for one ``id``; the last one is authoritative and readers should de-duplicate
+by ``id`` keeping the latest record.
+
+Usage::
+
+    python -m app.batch archive.tar.gz --output results.jsonl --workers 4
+    python -m app.batch scans/ --output results.jsonl --no-verify
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tarfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from typing import Any, Dict, Iterator, Set, Tuple
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp'}
+TEXT_EXTENSIONS = {'.txt'}
+
+def _kind(name: str):
+    ext = os.path.splitext(name)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    if ext in TEXT_EXTENSIONS:
+        return 'text'
+    return None
+
+def iter_inputs(path: str) -> Iterator[Tuple[str, str, bytes]]:
+    """Yield ``(item_id, kind, payload)`` from a directory tree or tar archive.
+
+    Tar archives (optionally compressed) are read in streaming mode, so the
+    archive is never extracted or held in memory.
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                kind = _kind(name)
+                if kind:
+                    full = os.path.join(root, name)
+                    with open(full, 'rb') as f:
+                        yield os.path.relpath(full, path), kind, f.read()
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                kind = _kind(member.name)
+                if member.isfile() and kind:
+                    yield os.path.normpath(member.name), kind, archive.extractfile(member).read()
+    else:
+        raise ValueError(f"{path} is neither a directory nor a tar archive")
+
+def load_checkpoint(output: str) -> Set[str]:
+    """Ids whose latest record in ``output`` has no error.
+
+    An unterminated final line, left by an interrupted run, is truncated so
+    the next append starts on a fresh line. Any other line that is not a
+    result record raises ``ValueError`` and leaves the file untouched.
+    """
+    done = set()
+    if not os.path.exists(output):
+        return done
+    valid_bytes = 0
+    with open(output, 'rb') as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.endswith(b'\n'):
+                break  # torn write; only the last line can lack a newline
+            try:
+                record = json.loads(line)
+                item_id = record['id']
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{output}:{lineno}: not a batch result record") from e
+            if 'error' in record:
+                done.discard(item_id)
+            else:
+                done.add(item_id)
+            valid_bytes += len(line)
+    if valid_bytes != os.path.getsize(output):
+        with open(output, 'r+b') as f:
+            f.truncate(valid_bytes)
+    return done
+
+# Per-process state: services are built on first use (or inherited from the
+# parent through fork), the event loop by _init_worker
+_services: Dict[str, Any] = {}
+_verify = True
+_loop = None
+
+def _service(name: str):
+    if name not in _services:
+        if name == 'ocr':
+            from app.services.ocr_service import OCRService
+            _services[name] = OCRService()
+        elif name == 'pharma':
+            from app.services.pharma_service import PharmaService
+            _services[name] = PharmaService()
+        else:
+            from app.services.verification_service import VerificationService
+            _services[name] = VerificationService()
+    return _services[name]
+
+def _build_services(verify: bool):
+    for name in ('ocr', 'pharma', 'verifier') if verify else ('ocr', 'pharma'):
+        _service(name)
+
+def _init_worker(threads: int, verify: bool):
+    global _loop, _verify
+    from app.utils.cpu_budget import cpu_budget
+    cpu_budget.configure(cores=threads)
+    _verify = verify
+    _loop = asyncio.new_event_loop()
+
+async def _process(item_id: str, kind: str, payload: bytes) -> Dict[str, Any]:
+    import cv2
+    import numpy as np
+    record = {'id': item_id, 'kind': kind}
+    if kind == 'image':
+        img = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Invalid image")
+        ocr_res = await _service('ocr').extract_text(img)
+        record['ocr'] = {k: ocr_res.get(k) for k in ('text', 'confidence', 'method')}
+        text = ocr_res['text']
+    else:
+        text = payload.decode('utf-8', errors='replace')
+    record['extracted'] = _service('pharma').extract_info(text)
+    if _verify:
+        result = await _service('verifier').verify(record['extracted'])
+        record['verification'] = result.model_dump(mode='json')
+    return record
+
+def process_item(item_id: str, kind: str, payload: bytes) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        record = _loop.run_until_complete(_process(item_id, kind, payload))
+    except Exception as e:
+        record = {'id': item_id, 'kind': kind, 'error': f"{type(e).__name__}: {e}"}
+    record['elapsed_s'] = round(time.perf_counter() - start, 4)
+    return record
+
+def run(args) -> Dict[str, Any]:
+    done = load_checkpoint(args.output)
+    threads = args.threads or max((os.cpu_count() or 1) // args.workers, 1)
+    verify = not args.no_verify
+
+    # With fork, load the models once here and let workers share them
+    # copy-on-write, as the pre-fork server does
+    use_fork = hasattr(os, 'fork') and not args.no_fork
+    if use_fork:
+        _build_services(verify)
+    pool = ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=get_context('fork' if use_fork else 'spawn'),
+        initializer=_init_worker,
+        initargs=(threads, verify)
+    )
+
+    stats = {'processed': 0, 'skipped': 0, 'errors': 0}
+    start = last_report = time.perf_counter()
+
+    def report(final=False):
+        elapsed = time.perf_counter() - start
+        rate = stats['processed'] / elapsed if elapsed else 0.0
+        print(f"{'done' if final else 'progress'}: {stats['processed']} processed, "
+              f"{stats['skipped']} skipped, {stats['errors']} errors, {rate:.2f} items/s",
+              file=sys.stderr)
+
+    max_in_flight = args.workers * 4
+    in_flight = set()
+    with pool, open(args.output, 'a', encoding='utf-8') as out:
+        def drain(block_until):
+            nonlocal last_report
+            while len(in_flight) > block_until:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    in_flight.discard(future)
+                    record = future.result()
+                    out.write(json.dumps(record, default=str) + '\n')
+                    stats['processed'] += 1
+                    stats['errors'] += 'error' in record
+                out.flush()
+                if time.perf_counter() - last_report >= args.report_every:
+                    last_report = time.perf_counter()
+                    report()
+
+        for item_id, kind, payload in iter_inputs(args.input):
+            if item_id in done:
+                stats['skipped'] += 1
+                continue
+            in_flight.add(pool.submit(process_item, item_id, kind, payload))
+            drain(max_in_flight - 1)
+            if args.limit and stats['processed'] + len(in_flight) >= args.limit:
+                break
+        drain(0)
+
+    report(final=True)
+    stats['elapsed_s'] = time.perf_counter() - start
+    stats['items_per_s'] = stats['processed'] / stats['elapsed_s'] if stats['elapsed_s'] else 0.0
+    return stats
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Reprocess archived label scans offline")
+    parser.add_argument('input', help='directory or tar archive of images / .txt OCR texts')
+    parser.add_argument('--output', default='batch_results.jsonl', help='JSON-lines results and checkpoint')
+    parser.add_argument('--workers', type=int, default=max((os.cpu_count() or 2) // 2, 1))
+    parser.add_argument('--threads', type=int, default=0, help='CPU threads per worker (default: cores / workers)')
+    parser.add_argument('--no-verify', action='store_true', help='skip upstream database verification')
+    parser.add_argument('--no-fork', action='store_true', help='load models in each worker instead of sharing')
+    parser.add_argument('--limit', type=int, default=0, help='stop after this many new items')
+    parser.add_argument('--report-every', type=float, default=10.0, help='seconds between progress lines')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    print(json.dumps(run(parse_args())))
@@ -11,7 +11,10 @@ from .schemas import (
     OCRResult,
     ExtractedInfo,
     DatabaseMatch,
-    VerificationResult
+    VerificationResult,
+    ProfilerConfig,
+    StreamFrameAck,
+    StreamUpdate
 )
 
 __all__ = [
@@ -22,5 +25,8 @@ __all__ = [
     "OCRResult",
     "ExtractedInfo",
     "DatabaseMatch",
-    "VerificationResult"
+    "VerificationResult",
+    "ProfilerConfig",
+    "StreamFrameAck",
+    "StreamUpdate"
 ]
@@ -62,3 +62,24 @@ class ErrorResponse(BaseModel):
     error_code: str
     message: str
     details: Optional[Dict[str, Any]] = None
+
+class ProfilerConfig(BaseModel):
+    sample_every: int = Field(ge=0, description="Profile 1 in N /verify requests; 0 disables sampling")
+    interval_ms: Optional[float] = Field(default=None, gt=0, le=1000)
+
+class StreamFrameAck(BaseModel):
+    type: str = "frame"
+    frame: int
+    accepted: bool
+    reason: Optional[str] = None
+    sharpness: float
+
+class StreamUpdate(BaseModel):
+    type: str = "result"
+    frame: int
+    frames_received: int
+    frames_processed: int
+    stable: bool
+    merged_text: str
+    extracted_info: Dict[str, Any]
+    verification_result: VerificationResult
@@ -0,0 +1,172 @@
+"""Pre-fork production server.
+
+Loads the OCR models once in a parent process, then forks worker processes
+that serve the API from a shared listening socket. Model weights live in
+pages inherited from the parent and are shared copy-on-write, so adding a
+worker costs its working set rather than another copy of TrOCR and torch.
+
+Usage::
+
+    python -m app.server --host 0.0.0.0 --port 8000 --workers 4
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Callable, Dict
+
+import uvicorn
+
+def threads_per_worker(workers: int, cpu_count: int = None) -> int:
+    """Split the cores evenly so torch/OpenMP pools do not oversubscribe"""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(cpu_count // max(workers, 1), 1)
+
+def _limit_threads(threads: int):
+    # Tesseract runs as a subprocess and reads OMP_THREAD_LIMIT from the
+    # inherited environment; torch and OpenCV keep in-process pools
+    for var in ('OMP_NUM_THREADS', 'OMP_THREAD_LIMIT', 'MKL_NUM_THREADS', 'WORKER_CPU_THREADS'):
+        os.environ[var] = str(threads)
+    import cv2
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # interop pool already started
+    cv2.setNumThreads(threads)
+    from app.utils.cpu_budget import cpu_budget
+    cpu_budget.configure(cores=threads)
+
+def _bind(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def _run_worker(app, sock: socket.socket, threads: int, args) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    _limit_threads(threads)
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=args.keep_alive,
+                            lifespan='on')
+    uvicorn.Server(config).run(sockets=[sock])
+
+def _spawn(app, sock: socket.socket, threads: int, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(app, sock, threads, args)
+        except BaseException:
+            traceback.print_exc()
+            sys.stderr.flush()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+def serve(args) -> None:
+    threads = args.threads or threads_per_worker(args.workers)
+    sock = _bind(args.host, args.port)
+
+    # Importing the app constructs the service singletons, which load the
+    # models. Freeze the resulting heap so the cyclic GC in workers does not
+    # touch (and thereby copy) the inherited pages.
+    from app.main import app
+    gc.collect()
+    gc.freeze()
+
+    print(f"🚀 Serving on {args.host}:{args.port} with {args.workers} workers x {threads} threads")
+    failed = _supervise(lambda: _spawn(app, sock, threads, args), args)
+    sock.close()
+    print("🛑 Shutting down...")
+    if failed:
+        sys.exit(1)
+
+def restart_delay(crashes: int) -> float:
+    """Backoff before restarting a worker that crashed ``crashes`` times in a row"""
+    return min(2 ** (crashes - 1), 60)
+
+def _supervise(spawn: Callable[[], int], args) -> bool:
+    """Keep ``args.workers`` workers running until SIGTERM/SIGINT.
+
+    Returns True if a worker kept crashing right after start-up and the
+    server gave up on it.
+    """
+    workers: Dict[int, int] = {}
+    started: Dict[int, float] = {}
+    crashes: Dict[int, int] = {}
+    for slot in range(args.workers):
+        workers[spawn()] = slot
+        started[slot], crashes[slot] = time.monotonic(), 0
+
+    stopping = False
+    failed = False
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    previous = {sig: signal.signal(sig, _stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+
+    try:
+        while workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            slot = workers.pop(pid, None)
+            if slot is None or stopping:
+                continue
+            # A worker that ran for a while crashed on its own; one that keeps
+            # dying right after start-up is retried with backoff, then given up on
+            if time.monotonic() - started[slot] >= args.stable_after:
+                crashes[slot] = 0
+            crashes[slot] += 1
+            if crashes[slot] > args.max_restarts:
+                print(f"❌ Worker {pid} exited with status {status} after {args.max_restarts} restarts, giving up")
+                failed = True
+                _stop(signal.SIGTERM, None)
+                continue
+            delay = restart_delay(crashes[slot])
+            print(f"⚠️ Worker {pid} exited with status {status}, restarting in {delay}s")
+            time.sleep(delay)
+            if stopping:  # signalled during the backoff; nobody would stop a new worker
+                continue
+            workers[spawn()] = slot
+            started[slot] = time.monotonic()
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+    return failed
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-fork Medicine Verifier API server")
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '8000')))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', '2')))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WORKER_THREADS', '0')),
+                        help='intra-op threads per worker (default: cores / workers)')
+    parser.add_argument('--keep-alive', type=int, default=5)
+    parser.add_argument('--max-restarts', type=int, default=5,
+                        help='consecutive quick worker crashes tolerated before the server exits')
+    parser.add_argument('--stable-after', type=float, default=30.0,
+                        help='seconds a worker must run before its crash count resets')
+    parser.add_argument('--log-level', default='info')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    if not hasattr(os, 'fork'):
+        sys.exit("The pre-fork server requires a POSIX platform; use uvicorn directly")
+    serve(parse_args())
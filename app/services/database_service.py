@@ -1,39 +1,255 @@
 import aiohttp
+import asyncio
 import os
-from typing import List, Dict, Any
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.utils.shared_cache import SharedCache, shared_cache
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__(f"rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+def _check_status(r: aiohttp.ClientResponse):
+    if r.status == 429:
+        raise RateLimited(_retry_after(r.headers.get('Retry-After')))
+    r.raise_for_status()
+
+class SourceHealth:
+    """Circuit breaker and latency window for one upstream source.
+
+    closed: requests flow, consecutive failures are counted.
+    open: requests are skipped until ``cooldown`` (or Retry-After) elapses.
+    half_open: a single probe request decides between closed and open.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 30.0, window: int = 50):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latencies = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.counts = {'success':0, 'failure':0, 'rate_limited':0, 'skipped':0, 'hedged':0}
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        if self.open_until == 0.0:
+            return self.CLOSED
+        return self.OPEN if time.monotonic() < self.open_until else self.HALF_OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        self.counts['skipped'] += 1
+        return False
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.counts['success'] += 1
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    def record_failure(self, error: Exception):
+        self.last_error = f"{type(error).__name__}: {error}"
+        self.consecutive_failures += 1
+        self.probing = False
+        if isinstance(error, RateLimited):
+            self.counts['rate_limited'] += 1
+            self.open_until = time.monotonic() + (error.retry_after if error.retry_after is not None else self.cooldown)
+            return
+        self.counts['failure'] += 1
+        if self.consecutive_failures >= self.failure_threshold or self.open_until:
+            self.open_until = time.monotonic() + self.cooldown
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        if len(self.latencies) < 5:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p90 = self.latency_quantile(0.5), self.latency_quantile(0.9)
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'retry_in_s': max(self.open_until - time.monotonic(), 0.0) if self.open_until else 0.0,
+            'p50_ms': p50 * 1000 if p50 is not None else None,
+            'p90_ms': p90 * 1000 if p90 is not None else None,
+            'last_error': self.last_error,
+            **self.counts
+        }
 
 class DatabaseService:
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0, cache: Optional[SharedCache] = None):
+        self.cache = cache or shared_cache
+        self.timeout = aiohttp.ClientTimeout(total=float(os.getenv('UPSTREAM_TIMEOUT','10')))
+        self.sources = {
+            'openfda': self.search_openfda,
+            'rxnorm': self.search_rxnorm,
+            'drugbank': self.search_drugbank
+        }
+        self.health = {name: SourceHealth(name, failure_threshold, cooldown) for name in self.sources}
+
     async def search_openfda(self, name: str) -> List[Dict[str,Any]]:
-        url = f"https://api.fda.gov/drug/label.json"
+        url = os.getenv('OPENFDA_URL','https://api.fda.gov')+"/drug/label.json"
         params={'search':f'openfda.brand_name:"{name}"','limit':5}
-        async with aiohttp.ClientSession() as s:
+        async with aiohttp.ClientSession(timeout=self.timeout) as s:
             async with s.get(url, params=params) as r:
+                if r.status==404:  # openFDA answers "no matches" with 404
+                    return []
+                _check_status(r)
                 data=await r.json()
                 return data.get('results',[])
 
     async def search_rxnorm(self, name: str) -> List[Dict[str,Any]]:
-        url=f"https://rxnav.nlm.nih.gov/REST/drugs.json"
+        url=os.getenv('RXNORM_URL','https://rxnav.nlm.nih.gov')+"/REST/drugs.json"
         params={'name':name}
-        async with aiohttp.ClientSession() as s:
+        async with aiohttp.ClientSession(timeout=self.timeout) as s:
             async with s.get(url, params=params) as r:
+                _check_status(r)
                 data=await r.json()
                 return data.get('drugGroup',{}).get('conceptGroup',[])
 
     async def search_drugbank(self, name: str) -> List[Dict[str,Any]]:
         key=os.getenv('DRUGBANK_API_KEY','')
-        url="https://api.drugbank.com/v1/us/drugs"
+        url=os.getenv('DRUGBANK_URL','https://api.drugbank.com')+"/v1/us/drugs"
         headers={'Authorization':f'Token {key}'}
         params={'q':name,'limit':5}
-        async with aiohttp.ClientSession() as s:
+        async with aiohttp.ClientSession(timeout=self.timeout) as s:
             async with s.get(url, headers=headers, params=params) as r:
+                _check_status(r)
                 data=await r.json()
                 return data.get('drugs',[])
 
-    async def universal_search(self, name: str) -> List[Dict[str,Any]]:
+    def is_configured(self, source: str) -> bool:
+        if source == 'drugbank':
+            return bool(os.getenv('DRUGBANK_API_KEY'))
+        return True
+
+    def cache_scope(self) -> str:
+        """Configured sources, part of every cache key so that configuring a
+        source (e.g. adding a DrugBank key) does not serve results without it"""
+        return '+'.join(source for source in self.sources if self.is_configured(source))
+
+    async def _hedged(self, fn, name: str, delay: float, health: SourceHealth) -> List[Dict[str,Any]]:
+        """Start a second attempt if the first is slower than ``delay``"""
+        first = asyncio.ensure_future(fn(name))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+            health.counts['hedged'] += 1
+            pending.add(asyncio.ensure_future(fn(name)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # both attempts failed; surface the original error
+            return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _search_source(self, source: str, name: str, hedge_delay: Optional[float]) -> Optional[List[Dict[str,Any]]]:
+        """Query one source; None means it was skipped or failed"""
+        health = self.health[source]
+        if not self.is_configured(source):
+            return []
+        if not health.allow():
+            return None
+        probe = health.probing
+        start = time.monotonic()
+        try:
+            if hedge_delay is not None:
+                res = await self._hedged(self.sources[source], name, hedge_delay, health)
+            else:
+                res = await self.sources[source](name)
+        except Exception as e:
+            health.record_failure(e)
+            return None
+        except asyncio.CancelledError:
+            # The caller went away (e.g. a closed stream); say nothing about
+            # the source but let the next lookup probe it
+            if probe:
+                health.probing = False
+            raise
+        health.record_success(time.monotonic() - start)
+        return res
+
+    def _hedge_target(self) -> Optional[tuple]:
+        """The slowest healthy source and its p90 latency, if known"""
+        candidates = []
+        for source, health in self.health.items():
+            p50, p90 = health.latency_quantile(0.5), health.latency_quantile(0.9)
+            if p50 is not None and health.state == SourceHealth.CLOSED and self.is_configured(source):
+                candidates.append((p50, source, p90))
+        if len(candidates) < 2:
+            return None
+        _, source, p90 = max(candidates)
+        return source, p90
+
+    async def lookup(self, name: str) -> Tuple[List[Dict[str,Any]], bool]:
+        """Search every source; the flag is False if any source was skipped or failed.
+
+        Complete results are stored in the shared cache so other workers can
+        reuse them; partial ones are not, so a recovered source is queried
+        again on the next lookup.
+        """
+        key = f"db:{self.cache_scope()}:{name.lower()}"
+        # SQLite may wait on another process's write lock; keep that off the loop
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return cached, True
+        hedge = self._hedge_target()
+        searches = [
+            self._search_source(source, name, hedge[1] if hedge and hedge[0] == source else None)
+            for source in self.sources
+        ]
         results=[]
-        for fn in (self.search_openfda, self.search_rxnorm, self.search_drugbank):
-            try:
-                res=await fn(name)
-                results.extend(res)
-            except: pass
+        complete=True
+        for res in await asyncio.gather(*searches):
+            if res is None:
+                complete=False
+                continue
+            results.extend(res)
+        if complete:
+            await asyncio.to_thread(self.cache.set, key, results)
+        return results, complete
+
+    async def universal_search(self, name: str) -> List[Dict[str,Any]]:
+        results, _ = await self.lookup(name)
         return results
+
+    def health_snapshot(self) -> Dict[str, Any]:
+        return {
+            source: {**health.snapshot(), 'configured': self.is_configured(source)}
+            for source, health in self.health.items()
+        }
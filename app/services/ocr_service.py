@@ -1,57 +1,134 @@
+import asyncio
 import cv2
+import hashlib
+import os
+import threading
 import numpy as np
+from collections import OrderedDict
 from PIL import Image
 import pytesseract
+import torch
 from transformers import TrOCRProcessor, VisionEncoderDecoderModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from app.utils.cpu_budget import CPUBudget, cpu_budget
+
+TROCR_MODEL = 'microsoft/trocr-base-printed'
+TROCR_BACKENDS = ('eager', 'quantized', 'onnx')
 
 class OCRService:
-    def __init__(self):
+    def __init__(self, backend: Optional[str] = None, max_length: Optional[int] = None,
+                 num_beams: Optional[int] = None, encoder_cache_size: Optional[int] = None,
+                 budget: Optional[CPUBudget] = None):
+        self.budget = budget or cpu_budget
         # Tesseract setup
         self.tesseract_configs = ['--oem 3 --psm 6', '--oem 3 --psm 8']
-        
+
+        # TrOCR generation settings; label lines are short so a small max_length
+        # bounds decoder steps without truncating real text
+        self.trocr_backend = backend or os.getenv('OCR_BACKEND', 'eager')
+        if self.trocr_backend not in TROCR_BACKENDS:
+            raise ValueError(f"Unknown OCR backend {self.trocr_backend!r}, expected one of {TROCR_BACKENDS}")
+        self.max_length = max_length or int(os.getenv('TROCR_MAX_LENGTH', '64'))
+        self.num_beams = num_beams or int(os.getenv('TROCR_NUM_BEAMS', '1'))
+        # Encoder outputs are only cached for callers that opt in (the camera
+        # stream); uploaded images are rarely repeated
+        self.encoder_cache_size = (encoder_cache_size if encoder_cache_size is not None
+                                   else int(os.getenv('TROCR_ENCODER_CACHE_SIZE', '8')))
+        self._encoder_cache = OrderedDict()
+        self._encoder_cache_lock = threading.Lock()
+
         # TrOCR setup
         try:
-            self.trocr_processor = TrOCRProcessor.from_pretrained('microsoft/trocr-base-printed')
-            self.trocr_model = VisionEncoderDecoderModel.from_pretrained('microsoft/trocr-base-printed')
+            self.trocr_processor = TrOCRProcessor.from_pretrained(TROCR_MODEL)
+            self.trocr_model = self._load_trocr_model(self.trocr_backend)
             self.trocr_available = True
         except:
             self.trocr_available = False
 
+    def _load_trocr_model(self, backend: str):
+        if backend == 'onnx':
+            try:
+                from optimum.onnxruntime import ORTModelForVision2Seq
+            except ImportError:
+                print("⚠️ optimum[onnxruntime] not installed, falling back to eager TrOCR")
+                self.trocr_backend = backend = 'eager'
+        if backend == 'onnx':
+            export_dir = './data/models/trocr-onnx'
+            if os.path.isdir(export_dir):
+                return ORTModelForVision2Seq.from_pretrained(export_dir)
+            model = ORTModelForVision2Seq.from_pretrained(TROCR_MODEL, export=True)
+            model.save_pretrained(export_dir)
+            return model
+        model = VisionEncoderDecoderModel.from_pretrained(TROCR_MODEL).eval()
+        if backend == 'quantized':
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
     def _preprocess(self, image: np.ndarray) -> np.ndarray:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim==3 else image
-        denoised = cv2.fastNlMeansDenoising(gray)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        return clahe.apply(denoised)
+        with self.budget.stage('preprocess'):
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim==3 else image
+            denoised = cv2.fastNlMeansDenoising(gray)
+            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+            return clahe.apply(denoised)
 
     def tesseract_ocr(self, image: np.ndarray) -> Dict[str, Any]:
         img = self._preprocess(image)
         pil = Image.fromarray(img)
         best = {'text':'','confidence':0}
-        for cfg in self.tesseract_configs:
-            text = pytesseract.image_to_string(pil, config=cfg).strip()
-            conf = min(len(text)/10,1.0)
-            if conf>best['confidence']:
-                best={'text':text,'confidence':conf,'method':'tesseract'}
+        with self.budget.stage('tesseract'):
+            for cfg in self.tesseract_configs:
+                text = pytesseract.image_to_string(pil, config=cfg).strip()
+                conf = min(len(text)/10,1.0)
+                if conf>best['confidence']:
+                    best={'text':text,'confidence':conf,'method':'tesseract'}
         return best
 
-    def trocr_ocr(self, image: np.ndarray) -> Dict[str, Any]:
+    def _encode(self, pixel_values: torch.Tensor, reuse: bool = False):
+        """Run the vision encoder; with ``reuse``, share outputs for recently seen images.
+
+        Cached outputs are handed out as shallow copies because ``generate()``
+        expands the encoder outputs in place for beam search.
+        """
+        if not reuse or self.encoder_cache_size <= 0:
+            return self.trocr_model.get_encoder()(pixel_values=pixel_values)
+        key = hashlib.sha1(pixel_values.numpy().tobytes()).hexdigest()
+        with self._encoder_cache_lock:
+            outputs = self._encoder_cache.get(key)
+            if outputs is not None:
+                self._encoder_cache.move_to_end(key)
+        if outputs is None:
+            outputs = self.trocr_model.get_encoder()(pixel_values=pixel_values)
+            with self._encoder_cache_lock:
+                self._encoder_cache[key] = outputs
+                while len(self._encoder_cache) > self.encoder_cache_size:
+                    self._encoder_cache.popitem(last=False)
+        return type(outputs)(**outputs)
+
+    def trocr_ocr(self, image: np.ndarray, reuse_encoder: bool = False) -> Dict[str, Any]:
         if not self.trocr_available:
             return {'text':'','confidence':0,'method':'trocr_unavailable'}
         pil = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
         inputs = self.trocr_processor(pil, return_tensors='pt').pixel_values
-        ids = self.trocr_model.generate(inputs, max_length=256)
+        gen_kwargs = {'max_length':self.max_length, 'num_beams':self.num_beams,
+                      'early_stopping':self.num_beams>1, 'use_cache':True}
+        with self.budget.stage('trocr'), torch.inference_mode():
+            if self.trocr_backend == 'onnx':
+                ids = self.trocr_model.generate(pixel_values=inputs, **gen_kwargs)
+            else:
+                ids = self.trocr_model.generate(encoder_outputs=self._encode(inputs, reuse_encoder), **gen_kwargs)
         text = self.trocr_processor.batch_decode(ids, skip_special_tokens=True)[0].strip()
         conf = min(len(text)/10,1.0)
-        return {'text':text,'confidence':conf,'method':'trocr'}
-
-    async def extract_text(self, image: np.ndarray) -> Dict[str, Any]:
-        # Run Tesseract
-        t_res = self.tesseract_ocr(image)
-        # Run TrOCR
-        results = [t_res]
-        if self.trocr_available:
-            results.append(self.trocr_ocr(image))
+        return {'text':text,'confidence':conf,'method':'trocr','backend':self.trocr_backend}
+
+    async def extract_text(self, image: np.ndarray, reuse_encoder: bool = False) -> Dict[str, Any]:
+        # Run Tesseract and TrOCR off the event loop; the CPU budget decides
+        # how many threads each gets and how many run at once
+        with self.budget.request():
+            jobs = [asyncio.to_thread(self.tesseract_ocr, image)]
+            if self.trocr_available:
+                jobs.append(asyncio.to_thread(self.trocr_ocr, image, reuse_encoder))
+            results = list(await asyncio.gather(*jobs))
         # Choose best
         valid = [r for r in results if r['confidence']>0]
         if not valid:
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import re
+import cv2
+import numpy as np
+from collections import Counter
+from fuzzywuzzy import fuzz
+from typing import Dict, Any, Optional, Tuple
+
+from app.models.schemas import StreamFrameAck, StreamUpdate
+from app.utils.cpu_budget import CPUBudget, cpu_budget
+from app.utils.image_utils import analyze_image_quality, frame_signature, signature_distance
+
+class TextMerger:
+    """Accumulate OCR text across frames.
+
+    Every token is kept at the position it was first seen at, so text from
+    frames showing different parts of a label adds up and label/value pairs
+    such as ``BATCH: AB1234`` stay adjacent. A near-identical spelling
+    (``PARACETAM0L``) is treated as a variant of the existing token, and the
+    variant read most often is the one shown.
+    """
+
+    def __init__(self, similarity: int = 85):
+        self.similarity = similarity
+        self.frames = 0
+        self.votes = Counter()
+        self.order: Dict[str, int] = {}
+        self.variants: Dict[str, Counter] = {}
+
+    def _canonical(self, key: str) -> str:
+        if key in self.votes or len(key) < 4:
+            return key
+        for known in self.votes:
+            if abs(len(known) - len(key)) <= 1 and fuzz.ratio(known, key) >= self.similarity:
+                return known
+        return key
+
+    def add(self, text: str):
+        self.frames += 1
+        seen = set()
+        for token in re.findall(r'\S+', text):
+            key = self._canonical(token.upper())
+            if key in seen:
+                continue
+            seen.add(key)
+            self.votes[key] += 1
+            self.order.setdefault(key, len(self.order))
+            self.variants.setdefault(key, Counter())[token] += 1
+
+    @property
+    def text(self) -> str:
+        return ' '.join(self.variants[t].most_common(1)[0][0] for t in sorted(self.votes, key=self.order.get))
+
+class StreamSession:
+    """Frame selection and incremental verification for one camera stream.
+
+    Incoming frames are decoded and scored (on a downscaled copy) in a worker
+    thread, and blurry frames or near-duplicates of the last OCR'd frame are
+    dropped. A camera held still only produces duplicates, so every
+    ``recheck_after``-th one is OCR'd again until the result is stable. Of the frames that
+    arrive while OCR is busy, only the sharpest is kept. Every OCR result is
+    merged into the running text, which is re-extracted and re-verified.
+    """
+
+    def __init__(self, ocr, pharma, verifier, min_sharpness: Optional[float] = None,
+                 duplicate_distance: int = 5, stable_updates: int = 3, recheck_after: int = 5,
+                 score_width: int = 320,
+                 max_frame_bytes: int = 10 * 1024 * 1024, budget: Optional[CPUBudget] = None):
+        self.ocr = ocr
+        self.pharma = pharma
+        self.verifier = verifier
+        self.min_sharpness = min_sharpness if min_sharpness is not None else float(os.getenv('STREAM_MIN_SHARPNESS', '50'))
+        self.duplicate_distance = duplicate_distance
+        self.stable_updates = stable_updates
+        self.recheck_after = recheck_after
+        self.score_width = score_width
+        self.max_frame_bytes = max_frame_bytes
+        self.budget = budget or cpu_budget
+        self.merger = TextMerger()
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.stable_count = 0
+        self._duplicates = 0
+        self._pending: Optional[Tuple[int, np.ndarray, float, int]] = None
+        self._last_signature: Optional[int] = None
+        self._last_sharpness = 0.0
+        self._last_key = None
+        self._ready = asyncio.Event()
+
+    def _decode_and_score(self, data: bytes) -> Optional[Tuple[np.ndarray, float, int]]:
+        with self.budget.stage('preprocess'):
+            frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                return None
+            small = frame
+            height, width = frame.shape[:2]
+            if width > self.score_width:
+                small = cv2.resize(frame, (self.score_width, int(height * self.score_width / width)),
+                                   interpolation=cv2.INTER_AREA)
+            return frame, analyze_image_quality(small)['sharpness'], frame_signature(small)
+
+    async def submit(self, data: bytes) -> StreamFrameAck:
+        """Decode and score a frame, keeping it if it is worth OCR'ing"""
+        self.frames_received += 1
+        index = self.frames_received
+        if len(data) > self.max_frame_bytes:
+            return StreamFrameAck(frame=index, accepted=False, reason='too_large', sharpness=0)
+        scored = await asyncio.to_thread(self._decode_and_score, data)
+        if scored is None:
+            return StreamFrameAck(frame=index, accepted=False, reason='invalid_image', sharpness=0)
+        frame, sharpness, signature = scored
+        reason = None
+        if sharpness < self.min_sharpness:
+            reason = 'blurry'
+        elif (self._last_signature is not None
+              and signature_distance(signature, self._last_signature) <= self.duplicate_distance
+              and sharpness < self._last_sharpness * 1.5):
+            self._duplicates += 1
+            if (self._duplicates < self.recheck_after or self._pending is not None
+                    or self.stable_count >= self.stable_updates):
+                reason = 'duplicate'
+        elif self._pending is not None and self._pending[2] >= sharpness:
+            reason = 'sharper_frame_pending'
+        if reason:
+            return StreamFrameAck(frame=index, accepted=False, reason=reason, sharpness=sharpness)
+        self._pending = (index, frame, sharpness, signature)
+        self._duplicates = 0
+        self._ready.set()
+        return StreamFrameAck(frame=index, accepted=True, sharpness=sharpness)
+
+    async def next_update(self) -> Optional[StreamUpdate]:
+        """OCR the best pending frame; returns an update when the result changed or became stable"""
+        await self._ready.wait()
+        self._ready.clear()
+        index, frame, sharpness, signature = self._pending
+        self._pending = None
+        self._last_signature, self._last_sharpness = signature, sharpness
+
+        ocr_res = await self.ocr.extract_text(frame, reuse_encoder=True)
+        self.frames_processed += 1
+        self.merger.add(ocr_res['text'])
+        merged = self.merger.text
+        extracted = self.pharma.extract_info(merged)
+        result = await self.verifier.verify(extracted)
+
+        best = result.verification_details.get('best_match', {}).get('brand_name')
+        key = (best, result.risk_level, result.is_authentic, extracted['batch_number'], extracted['expiry_date'])
+        changed = key != self._last_key
+        self.stable_count = 0 if changed else self.stable_count + 1
+        self._last_key = key
+        if not changed and self.stable_count != self.stable_updates:
+            return None
+        return StreamUpdate(
+            frame=index,
+            frames_received=self.frames_received,
+            frames_processed=self.frames_processed,
+            stable=self.stable_count >= self.stable_updates,
+            merged_text=merged,
+            extracted_info=extracted,
+            verification_result=result
+        )
@@ -1,17 +1,26 @@
-from typing import Dict, Any, List
+import asyncio
+from typing import Dict, Any, List, Optional
 from .database_service import DatabaseService
 from app.models.schemas import DatabaseMatch, VerificationResult, CounterfeitRisk
+from app.utils.shared_cache import SharedCache, shared_cache
 from app.utils.text_utils import fuzzy_match_medicines
 
 class VerificationService:
-    def __init__(self):
-        self.db = DatabaseService()
+    def __init__(self, cache: Optional[SharedCache] = None):
+        self.cache = cache or shared_cache
+        self.db = DatabaseService(cache=self.cache)
 
     async def verify(self, extracted: Dict[str,Any]) -> Dict[str,Any]:
         names=[m['name'] for m in extracted['medicine_names']]
+        key=f'verify:{self.db.cache_scope()}:'+'|'.join(name.lower() for name in names)
+        cached=await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return VerificationResult(**cached)
         all_matches=[]
+        complete=True
         for name in names:
-            data=await self.db.universal_search(name)
+            data,found_all=await self.db.lookup(name)
+            complete=complete and found_all
             for item in data:
                 # Simplified mapping
                 bn=item.get('openfda',{}).get('brand_name',[name])[0]
@@ -43,7 +52,7 @@ class VerificationService:
             elif score>=0.5: risk=CounterfeitRisk.MEDIUM
             else: risk=CounterfeitRisk.HIGH
         
-        return VerificationResult(
+        result = VerificationResult(
             is_authentic=is_auth,
             confidence_score=score,
             risk_level=risk,
@@ -51,3 +60,6 @@ class VerificationService:
             verification_details={'best_match':best.dict() if all_matches else {}},
             warning_flags=[]
         )
+        if complete and names:
+            await asyncio.to_thread(self.cache.set, key, result.dict())
+        return result
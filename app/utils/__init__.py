@@ -8,7 +8,9 @@ from .image_utils import (
     validate_image,
     preprocess_image,
     analyze_image_quality,
-    setup_directories
+    setup_directories,
+    frame_signature,
+    signature_distance
 )
 from .text_utils import (
     clean_text,
@@ -17,15 +19,25 @@ from .text_utils import (
     extract_company_info,
     fuzzy_match_medicines
 )
+from .profiler import SamplingProfiler
+from .cpu_budget import CPUBudget, cpu_budget
+from .shared_cache import SharedCache, shared_cache
 
 __all__ = [
     "validate_image",
     "preprocess_image", 
     "analyze_image_quality",
     "setup_directories",
+    "frame_signature",
+    "signature_distance",
     "clean_text",
     "detect_language",
     "extract_medicine_names",
     "extract_company_info",
-    "fuzzy_match_medicines"
+    "fuzzy_match_medicines",
+    "SamplingProfiler",
+    "CPUBudget",
+    "cpu_budget",
+    "SharedCache",
+    "shared_cache"
 ]
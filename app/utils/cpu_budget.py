@@ -0,0 +1,142 @@
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+from app.utils.profiler import profile_thread
+
+# Stages whose libraries (OpenCV, the Tesseract subprocess) only honour the
+# process-wide thread settings
+PROCESS_WIDE_STAGES = frozenset({'preprocess', 'tesseract'})
+
+class CPUBudget:
+    """Process-wide CPU budget for CPU-heavy stages (OpenCV, Tesseract, torch).
+
+    Every heavy stage acquires as many core slots as the threads it will
+    actually use, so the threads running at once never exceed
+    ``cores * stages_per_core``.
+
+    Torch's intra-op thread count is set per calling thread, so torch stages
+    get a budget that follows the request load: with up to
+    ``low_latency_requests`` requests in flight the cores are split between
+    them (low-latency mode); beyond that each stage gets a single thread and
+    concurrency comes from running more stages side by side (throughput
+    mode).
+
+    OpenCV's pool and ``OMP_THREAD_LIMIT`` (read by every Tesseract
+    subprocess) are process-wide: changing them per stage would resize the
+    pools of stages already running. They are set once to ``global_threads``
+    (the torch budget at the low-latency limit) and stay fixed until the next
+    ``configure()``, and the stages in ``PROCESS_WIDE_STAGES`` always reserve
+    exactly that many slots.
+    """
+
+    def __init__(self, cores: Optional[int] = None, stages_per_core: Optional[float] = None,
+                 low_latency_requests: Optional[int] = None):
+        self.stats = Counter()
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._requests = 0
+        self._globals_applied = False
+        self._local = threading.local()
+        self.configure(cores, stages_per_core, low_latency_requests)
+
+    def configure(self, cores: Optional[int] = None, stages_per_core: Optional[float] = None,
+                  low_latency_requests: Optional[int] = None):
+        """Size the budget; unset values come from the environment"""
+        with self._cond:
+            self.cores = cores or int(os.getenv('WORKER_CPU_THREADS') or 0) or os.cpu_count() or 1
+            stages_per_core = stages_per_core or float(os.getenv('CPU_STAGES_PER_CORE', '1'))
+            self.slots = max(int(self.cores * stages_per_core), 1)
+            self.low_latency_requests = low_latency_requests or int(
+                os.getenv('CPU_LOW_LATENCY_REQUESTS') or max(self.cores // 2, 1))
+            self.global_threads = min(max(self.cores // self.low_latency_requests, 1), self.slots)
+            self._globals_applied = False
+            self._cond.notify_all()
+
+    @property
+    def mode(self) -> str:
+        return 'low_latency' if self._requests <= self.low_latency_requests else 'throughput'
+
+    def threads_for(self, stage: str) -> int:
+        """Thread budget a stage starting now would receive"""
+        if stage in PROCESS_WIDE_STAGES:
+            return self.global_threads
+        if self.mode == 'throughput':
+            return 1
+        return max(self.cores // max(self._requests, 1), 1)
+
+    @contextmanager
+    def request(self):
+        """Track an in-flight request so budgets adapt to load"""
+        with self._cond:
+            self._requests += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._requests -= 1
+
+    @contextmanager
+    def stage(self, name: str):
+        """Run a heavy stage within the budget, yielding its thread count.
+
+        Blocks the calling thread until enough core slots are free. Nested
+        stages on the same thread reuse the outer stage's slots.
+        """
+        held = getattr(self._local, 'threads', None)
+        if held is not None:
+            yield held
+            return
+        with self._cond:
+            threads = min(self.threads_for(name), self.slots)
+            def fits():
+                return self._in_use == 0 or self._in_use + threads <= self.slots
+            if not fits():
+                self.stats['waits'] += 1
+            self._cond.wait_for(fits)
+            self._apply(name, threads)
+            self._in_use += threads
+            self.stats[name] += 1
+        self._local.threads = threads
+        try:
+            with profile_thread():
+                yield threads
+        finally:
+            self._local.threads = None
+            with self._cond:
+                self._in_use -= threads
+                self._cond.notify_all()
+
+    def _apply(self, stage: str, threads: int):
+        if not self._globals_applied:
+            self._apply_globals()
+        if stage in PROCESS_WIDE_STAGES:
+            return
+        # torch.set_num_threads only affects the calling thread
+        if getattr(self._local, 'torch_threads', None) != threads and 'torch' in sys.modules:
+            sys.modules['torch'].set_num_threads(threads)
+            self._local.torch_threads = threads
+
+    def _apply_globals(self):
+        os.environ['OMP_THREAD_LIMIT'] = str(self.global_threads)
+        # Only touch libraries that are already loaded
+        if 'cv2' in sys.modules:
+            sys.modules['cv2'].setNumThreads(self.global_threads)
+        self._globals_applied = True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'cores': self.cores,
+                'slots': self.slots,
+                'slots_in_use': self._in_use,
+                'requests_in_flight': self._requests,
+                'mode': self.mode,
+                'global_threads': self.global_threads,
+                'stage_counts': dict(self.stats)
+            }
+
+cpu_budget = CPUBudget()
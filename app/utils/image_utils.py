@@ -6,6 +6,8 @@ from typing import Tuple, Dict
 import base64
 import io
 
+from app.utils.cpu_budget import cpu_budget
+
 def setup_directories():
     """Create necessary directories"""
     dirs = ["./data", "./data/temp", "./data/cache", "./data/models"]
@@ -26,6 +28,10 @@ def validate_image(image_bytes: bytes, max_size: int = 10 * 1024 * 1024) -> bool
 
 def preprocess_image(image: np.ndarray) -> Dict[str, np.ndarray]:
     """Preprocess image for better OCR results"""
+    with cpu_budget.stage('preprocess'):
+        return _preprocess_variants(image)
+
+def _preprocess_variants(image: np.ndarray) -> Dict[str, np.ndarray]:
     results = {}
     
     # Original
@@ -106,3 +112,18 @@ def base64_to_image(base64_string: str) -> np.ndarray:
     nparr = np.frombuffer(image_data, np.uint8)
     image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     return image
+
+def frame_signature(image: np.ndarray, hash_size: int = 8, margin: int = 2) -> int:
+    """Difference hash (dHash) of an image as a ``hash_size**2``-bit integer.
+
+    Neighbouring cells must differ by more than ``margin`` grey levels to set
+    a bit, so sensor noise on flat backgrounds does not flip bits.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] - small[:, :-1] > margin).flatten()
+    return int(''.join('1' if b else '0' for b in bits), 2)
+
+def signature_distance(a: int, b: int) -> int:
+    """Number of differing bits between two frame signatures"""
+    return bin(a ^ b).count('1')
@@ -0,0 +1,175 @@
+import contextvars
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+# (profiler, profile_id) of the request running in the current context;
+# copied into worker threads by asyncio.to_thread
+_current_profile = contextvars.ContextVar('current_profile', default=None)
+
+@contextmanager
+def profile_thread():
+    """Include the calling thread in the current request's profile, if any"""
+    current = _current_profile.get()
+    if current is None:
+        yield
+        return
+    profiler, profile_id = current
+    thread_id = threading.get_ident()
+    profiler._attach(profile_id, thread_id)
+    try:
+        yield
+    finally:
+        profiler._detach(profile_id, thread_id)
+
+def _collapse_stack(frame, anchor=None) -> Optional[str]:
+    """Render a frame chain as a root-first, ';'-separated collapsed stack.
+
+    Returns None when ``anchor`` is given but is not part of the chain.
+    """
+    parts = []
+    found = anchor is None
+    while frame is not None:
+        found = found or frame is anchor
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    if not found:
+        return None
+    parts.reverse()
+    return ';'.join(parts)
+
+def format_collapsed(stacks: Counter) -> str:
+    """Format stack counts in the flamegraph.pl / speedscope collapsed format"""
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler for in-flight requests.
+
+    A single daemon thread wakes every ``interval`` seconds while at least one
+    profile is active and records the current stack of each profiled thread
+    from ``sys._current_frames()``. A profile covers the thread that started
+    it plus any worker thread that enters ``profile_thread()`` on its behalf.
+    Profiled code is never instrumented, so the cost to the request is limited
+    to the sampler briefly holding the GIL.
+
+    The starting thread is usually the event loop, which also runs every
+    other in-flight request. Its samples are therefore only kept while the
+    frame that called ``start()`` is on the stack, i.e. while the profiled
+    request's own coroutine chain is executing.
+    """
+
+    def __init__(self, interval: float = 0.005, sample_every: int = 0, max_requests: int = 50):
+        self.interval = interval
+        self.sample_every = sample_every  # profile 1 in N requests, 0 disables
+        self.max_requests = max_requests
+        self.aggregate = Counter()
+        self.requests: 'OrderedDict[str, Counter]' = OrderedDict()
+        self.profiled_requests = 0
+        self._seen = 0
+        self._active: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def configure(self, sample_every: int, interval: Optional[float] = None):
+        with self._lock:
+            self.sample_every = max(int(sample_every), 0)
+            self._seen = 0
+            if interval:
+                self.interval = interval
+
+    def should_sample(self) -> bool:
+        """Return True for every ``sample_every``-th call"""
+        with self._lock:
+            if self.sample_every <= 0:
+                return False
+            self._seen += 1
+            return self._seen % self.sample_every == 0
+
+    def start(self, thread_id: Optional[int] = None) -> str:
+        """Begin sampling ``thread_id`` (default: caller) and return a profile id.
+
+        Without ``thread_id`` the calling thread is only sampled while the
+        caller's frame is executing, so concurrent tasks on the same event
+        loop are left out of the profile.
+        """
+        profile_id = uuid.uuid4().hex[:12]
+        owner = thread_id or threading.get_ident()
+        anchor = sys._getframe(1) if thread_id is None else None
+        with self._lock:
+            self._active[profile_id] = ({owner}, Counter(), owner, anchor)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        _current_profile.set((self, profile_id))
+        return profile_id
+
+    def _attach(self, profile_id: str, thread_id: int):
+        with self._lock:
+            if profile_id in self._active:
+                self._active[profile_id][0].add(thread_id)
+
+    def _detach(self, profile_id: str, thread_id: int):
+        with self._lock:
+            if profile_id in self._active:
+                self._active[profile_id][0].discard(thread_id)
+
+    def stop(self, profile_id: str) -> Counter:
+        """Stop a profile, fold it into the aggregate and keep it for download"""
+        with self._lock:
+            _, stacks, _, _ = self._active.pop(profile_id, (None, Counter(), None, None))
+            if _current_profile.get() == (self, profile_id):
+                _current_profile.set(None)
+            if not self._active:
+                self._wake.clear()
+            self.aggregate.update(stacks)
+            self.profiled_requests += 1
+            self.requests[profile_id] = stacks
+            while len(self.requests) > self.max_requests:
+                self.requests.popitem(last=False)
+        return stacks
+
+    def reset(self):
+        with self._lock:
+            self.aggregate = Counter()
+            self.requests.clear()
+            self.profiled_requests = 0
+
+    def collapsed(self, profile_id: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            stacks = self.aggregate if profile_id is None else self.requests.get(profile_id)
+            return None if stacks is None else format_collapsed(stacks)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'sample_every': self.sample_every,
+                'interval_ms': self.interval * 1000,
+                'active_profiles': len(self._active),
+                'profiled_requests': self.profiled_requests,
+                'total_samples': sum(self.aggregate.values()),
+                'recent_profiles': list(self.requests.keys())
+            }
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_ids, stacks, owner, anchor in self._active.values():
+                    for thread_id in thread_ids:
+                        frame = frames.get(thread_id)
+                        if frame is None:
+                            continue
+                        stack = _collapse_stack(frame, anchor if thread_id == owner else None)
+                        if stack is not None:
+                            stacks[stack] += 1
+            del frames
@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at);
+CREATE INDEX IF NOT EXISTS cache_created ON cache (created_at);
+"""
+
+class SharedCache:
+    """JSON key/value cache shared by every worker process on a node.
+
+    Entries live in a SQLite database in WAL mode, so readers never block the
+    single writer and every process sees another's writes immediately. Each
+    set is one ``INSERT OR REPLACE`` statement and therefore atomic. A daemon
+    thread per process periodically drops expired rows and evicts the oldest
+    entries once the stored payload exceeds ``max_bytes``.
+
+    Cache failures are never fatal: errors are swallowed and reported as
+    misses so lookups fall through to the upstream sources. Calls can block
+    for up to five seconds while another process holds the write lock, so
+    async code runs them with ``asyncio.to_thread``.
+    """
+
+    def __init__(self, path: Optional[str] = None, default_ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, compact_interval: float = 60.0,
+                 enabled: Optional[bool] = None):
+        self.path = path or os.getenv('SHARED_CACHE_PATH', './data/cache/lookup.sqlite')
+        self.default_ttl = default_ttl or float(os.getenv('SHARED_CACHE_TTL', str(24 * 3600)))
+        self.max_bytes = max_bytes or int(os.getenv('SHARED_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+        self.compact_interval = compact_interval
+        self.enabled = enabled if enabled is not None else os.getenv('SHARED_CACHE_ENABLED', '1') != '0'
+        self.stats = {'hits': 0, 'misses': 0, 'sets': 0, 'errors': 0, 'evicted': 0}
+        self._local = threading.local()
+        self._compactor_pid = None
+        self._lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Connections must not cross threads or a fork, and follow the path
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.key == (os.getpid(), self.path):
+            return conn
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        self._local.conn, self._local.key = conn, (os.getpid(), self.path)
+        self._ensure_compactor()
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        try:
+            row = self._conn().execute(
+                'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+            ).fetchone()
+            value = json.loads(row[0]) if row is not None else None
+        except (sqlite3.Error, ValueError):
+            self.stats['errors'] += 1
+            return None
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        if not self.enabled:
+            return
+        payload = json.dumps(value, default=str)
+        now = time.time()
+        try:
+            self._conn().execute(
+                'INSERT OR REPLACE INTO cache (key, value, size, created_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                (key, payload, len(payload), now, now + (ttl or self.default_ttl))
+            )
+            self.stats['sets'] += 1
+        except sqlite3.Error:
+            self.stats['errors'] += 1
+
+    def delete(self, key: str):
+        try:
+            self._conn().execute('DELETE FROM cache WHERE key = ?', (key,))
+        except sqlite3.Error:
+            self.stats['errors'] += 1
+
+    def compact(self) -> int:
+        """Drop expired rows and evict oldest entries beyond ``max_bytes``"""
+        conn = self._conn()
+        removed = conn.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),)).rowcount
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+        if total > self.max_bytes:
+            # Evict down to 90% so compaction does not run on every insert
+            excess = total - int(self.max_bytes * 0.9)
+            cutoff = conn.execute(
+                'SELECT created_at FROM (SELECT created_at, SUM(size) OVER (ORDER BY created_at) AS running '
+                'FROM cache) WHERE running >= ? ORDER BY created_at LIMIT 1', (excess,)
+            ).fetchone()
+            if cutoff is not None:
+                removed += conn.execute('DELETE FROM cache WHERE created_at <= ?', (cutoff[0],)).rowcount
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.stats['evicted'] += removed
+        return removed
+
+    def _ensure_compactor(self):
+        with self._lock:
+            if self._compactor_pid == os.getpid():
+                return
+            self._compactor_pid = os.getpid()
+        threading.Thread(target=self._compact_loop, name='shared-cache-compactor', daemon=True).start()
+
+    def _compact_loop(self):
+        while True:
+            time.sleep(self.compact_interval)
+            try:
+                self.compact()
+            except sqlite3.Error:
+                self.stats['errors'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        info = {'path': self.path, 'enabled': self.enabled, **self.stats}
+        try:
+            info['entries'], info['bytes'] = self._conn().execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+        except sqlite3.Error:
+            pass
+        return info
+
+shared_cache = SharedCache()
@@ -0,0 +1,7 @@
+"""Benchmark Module
+
+Synthetic label generation, local upstream stubs, per-stage micro-benchmarks
+and a concurrent end-to-end load test for the medicine verification API.
+
+Run with ``python -m benchmarks.run --output results.json``.
+"""
@@ -0,0 +1,206 @@
+"""Run per-stage micro-benchmarks and a concurrent end-to-end load test.
+
+Example::
+
+    python -m benchmarks.run --images 20 --requests 200 --concurrency 16 \\
+        --output results.json --baseline previous.json
+
+Upstream databases are replaced by local stubs (see ``benchmarks.stubs``) so
+results do not depend on openFDA/RxNorm/DrugBank availability. With ``--url``
+the load test targets a running server, which queries whatever upstreams it
+was started with; no stubs are started and ``upstream_requests`` is omitted.
+Start the server with ``OPENFDA_URL``/``RXNORM_URL``/``DRUGBANK_URL`` pointing
+at stubs of your own to keep it off the real databases.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Any
+
+from benchmarks.stubs import running_stubs
+from benchmarks.synthetic import BRANDS, generate_labels, label_lines, encode_png
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    ordered = sorted(samples)
+    def pct(p):
+        return ordered[min(int(p * len(ordered)), len(ordered) - 1)] * 1000
+    return {
+        'n': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'max_ms': ordered[-1] * 1000
+    }
+
+def time_calls(fn: Callable, inputs: list, repeat: int = 1) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        for arg in inputs:
+            start = time.perf_counter()
+            fn(arg)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+def run_micro(labels: list, repeat: int) -> Dict[str, Any]:
+    from app.services.ocr_service import OCRService
+    from app.services.pharma_service import PharmaService
+    from app.utils.text_utils import fuzzy_match_medicines
+
+    ocr = OCRService()
+    pharma = PharmaService()
+    images = [img for img, _ in labels]
+    texts = ['\n'.join(label_lines(fields)) for _, fields in labels]
+    results = {}
+
+    results['_preprocess'] = summarize(time_calls(ocr._preprocess, images, repeat))
+    results['PharmaService.extract_info'] = summarize(time_calls(pharma.extract_info, texts, repeat))
+    results['fuzzy_match_medicines'] = summarize(time_calls(
+        lambda fields: fuzzy_match_medicines(fields['brand'], BRANDS), [f for _, f in labels], repeat))
+
+    # OCR modes: latency plus how often the rendered brand name is recovered
+    engines = {'tesseract_ocr': ocr.tesseract_ocr}
+    if ocr.trocr_available:
+        engines['trocr_ocr'] = ocr.trocr_ocr
+    for name, fn in engines.items():
+        samples, hits = [], 0
+        for img, fields in labels:
+            start = time.perf_counter()
+            out = fn(img)
+            samples.append(time.perf_counter() - start)
+            hits += fields['brand'] in out['text'].upper()
+        results[name] = {**summarize(samples), 'brand_recall': hits / len(labels)}
+    return results
+
+async def run_load(payloads: List[bytes], requests: int, concurrency: int, url: str = None) -> Dict[str, Any]:
+    import httpx
+
+    if url:
+        client = httpx.AsyncClient(base_url=url, timeout=120)
+    else:
+        from app.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench', timeout=120)
+
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(payloads[i % len(payloads)])
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                r = await client.post('/api/v1/verify', files={'image': ('label.png', body, 'image/png')})
+                if r.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    async with client:
+        wall = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - wall
+
+    return {
+        **summarize(latencies),
+        'concurrency': concurrency,
+        'errors': errors,
+        'wall_s': wall,
+        'throughput_rps': requests / wall
+    }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Return human-readable regressions above ``threshold`` percent"""
+    regressions = []
+    sections = [('stages', name) for name in current.get('stages', {})] + [('load', None)]
+    for section, name in sections:
+        old = baseline.get(section, {})
+        new = current.get(section, {})
+        if name is not None:
+            old, new = old.get(name, {}), new.get(name, {})
+        label = name or section
+        for metric in ('p50_ms', 'p95_ms'):
+            if old.get(metric) and new.get(metric):
+                change = (new[metric] - old[metric]) / old[metric] * 100
+                print(f"{label:32s} {metric:7s} {old[metric]:10.2f} -> {new[metric]:10.2f} ({change:+.1f}%)")
+                if change > threshold:
+                    regressions.append(f"{label} {metric} {change:+.1f}%")
+    return regressions
+
+async def main(args) -> Dict[str, Any]:
+    labels = list(generate_labels(args.images, seed=args.seed))
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args)
+        }
+    }
+    if args.url:
+        # A remote server talks to whatever upstreams it was started with, so
+        # local stubs would never see its traffic
+        await run_stages(report, labels, args)
+        return report
+    async with running_stubs(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                             error_rate=args.error_rate, seed=args.seed) as stubs:
+        # Keep the in-process app on the throwaway cache even if it was
+        # imported before the stubs started
+        from app.utils.shared_cache import shared_cache
+        shared_cache.path = os.environ['SHARED_CACHE_PATH']
+        await run_stages(report, labels, args)
+        report['upstream_requests'] = {name: stub.requests for name, stub in stubs.items()}
+        report['shared_cache'] = shared_cache.snapshot()
+    return report
+
+async def run_stages(report: Dict[str, Any], labels: list, args) -> None:
+    if not args.skip_micro:
+        report['stages'] = run_micro(labels, args.repeat)
+    if args.requests:
+        payloads = [encode_png(img) for img, _ in labels]
+        report['load'] = await run_load(payloads, args.requests, args.concurrency, args.url)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=10, help='synthetic labels to generate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions for cheap stages')
+    parser.add_argument('--requests', type=int, default=50, help='end-to-end requests, 0 to skip')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--url', help='target a running server instead of the in-process app '
+                                      '(no stubs; the server uses its own upstream URLs)')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='stub upstream latency')
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of stub 503s')
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='previous results JSON to compare against')
+    parser.add_argument('--fail-threshold', type=float, default=20.0,
+                        help='exit non-zero if a p50/p95 regresses by more than this percent')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    report = asyncio.run(main(args))
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.fail_threshold)
+        if regressions:
+            print("Regressions: " + ', '.join(regressions))
+            sys.exit(1)
@@ -0,0 +1,141 @@
+import abc
+import asyncio
+import os
+import random
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from aiohttp import web
+
+from benchmarks.synthetic import BRANDS
+
+CATALOG = {brand.lower(): {'brand': brand.title(), 'manufacturer': 'Stub Pharma Ltd'} for brand in BRANDS}
+
+class StubUpstream(abc.ABC):
+    """Local stand-in for an upstream drug database with configurable latency"""
+
+    def __init__(self, name: str, latency_ms: float = 50.0, jitter_ms: float = 10.0,
+                 error_rate: float = 0.0, seed: int = 0, error_status: int = 503):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ''
+
+    async def _delay(self):
+        delay = max(self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms), 0)
+        await asyncio.sleep(delay / 1000)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await self._delay()
+        if self._rng.random() < self.error_rate:
+            headers = {'Retry-After': '60'} if self.error_status == 429 else None
+            return web.json_response({'error': 'stub failure'}, status=self.error_status, headers=headers)
+        return web.json_response(self.payload(request))
+
+    @abc.abstractmethod
+    def payload(self, request: web.Request) -> Dict:
+        """JSON body answering ``request``"""
+
+    @abc.abstractmethod
+    def app(self) -> web.Application:
+        """aiohttp application routing the upstream's endpoint to ``handle``"""
+
+    async def start(self) -> str:
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+class OpenFDAStub(StubUpstream):
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/drug/label.json', self.handle)
+        return app
+
+    def payload(self, request):
+        # search looks like openfda.brand_name:"Name"
+        name = request.query.get('search', '').split(':', 1)[-1].strip('"').lower()
+        entry = CATALOG.get(name)
+        if not entry:
+            return {'results': []}
+        return {'results': [{
+            'id': f"fda-{name}",
+            'openfda': {
+                'brand_name': [entry['brand']],
+                'generic_name': [entry['brand']],
+                'manufacturer_name': [entry['manufacturer']]
+            }
+        }]}
+
+class RxNormStub(StubUpstream):
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/REST/drugs.json', self.handle)
+        return app
+
+    def payload(self, request):
+        name = request.query.get('name', '').lower()
+        if name not in CATALOG:
+            return {'drugGroup': {'name': name}}
+        return {'drugGroup': {'name': name, 'conceptGroup': [
+            {'tty': 'SBD', 'conceptProperties': [{'rxcui': '0', 'name': CATALOG[name]['brand']}]}
+        ]}}
+
+class DrugBankStub(StubUpstream):
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/v1/us/drugs', self.handle)
+        return app
+
+    def payload(self, request):
+        name = request.query.get('q', '').lower()
+        if name not in CATALOG:
+            return {'drugs': []}
+        return {'drugs': [{'id': f"DB-{name}", 'name': CATALOG[name]['brand']}]}
+
+@asynccontextmanager
+async def running_stubs(latency_ms: float = 50.0, jitter_ms: float = 10.0,
+                        error_rate: float = 0.0, seed: int = 0):
+    """Start all three stubs and point ``DatabaseService`` at them via env vars.
+
+    Stub answers count as complete lookups, so the shared lookup cache is
+    moved to a throwaway directory: stub matches must never reach the real
+    cache, and every run should start cold. Import the app inside the block
+    so its cache singleton picks up the temporary path.
+    """
+    stubs = {
+        'OPENFDA_URL': OpenFDAStub('openfda', latency_ms, jitter_ms, error_rate, seed),
+        'RXNORM_URL': RxNormStub('rxnorm', latency_ms, jitter_ms, error_rate, seed + 1),
+        'DRUGBANK_URL': DrugBankStub('drugbank', latency_ms, jitter_ms, error_rate, seed + 2)
+    }
+    previous = {key: os.environ.get(key) for key in (*stubs, 'DRUGBANK_API_KEY', 'SHARED_CACHE_PATH')}
+    cache_dir = tempfile.TemporaryDirectory(prefix='bench-cache-')
+    try:
+        for key, stub in stubs.items():
+            os.environ[key] = await stub.start()
+        os.environ.setdefault('DRUGBANK_API_KEY', 'stub')
+        os.environ['SHARED_CACHE_PATH'] = os.path.join(cache_dir.name, 'lookup.sqlite')
+        yield {stub.name: stub for stub in stubs.values()}
+    finally:
+        for stub in stubs.values():
+            await stub.stop()
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        cache_dir.cleanup()
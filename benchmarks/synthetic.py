@@ -0,0 +1,83 @@
+import random
+import cv2
+import numpy as np
+from typing import Dict, Tuple
+
+BRANDS = [
+    'PARACETAMOL', 'AMOXICILLIN', 'AZITHROMYCIN', 'CIPROFLOXACIN', 'IBUPROFEN',
+    'ASPIRIN', 'DOXYCYCLINE', 'CROCIN', 'COMBIFLAM', 'OMEPRAZOLE'
+]
+COMPANIES = ['CIPLA PHARMACEUTICALS', 'SUN PHARMA', 'LUPIN LABS', 'PFIZER', 'ABBOTT']
+STRENGTHS = ['100mg', '250mg', '500mg', '650mg', '5ml']
+MONTHS = ['01', '03', '06', '09', '12']
+
+def random_label_fields(rng: random.Random) -> Dict[str, str]:
+    """Pick a random but plausible set of label fields"""
+    return {
+        'brand': rng.choice(BRANDS),
+        'strength': rng.choice(STRENGTHS),
+        'company': rng.choice(COMPANIES),
+        'batch': f"{rng.choice('ABCDEFGH')}{rng.choice('ABCDEFGH')}{rng.randint(1000, 9999)}",
+        'expiry': f"{rng.choice(MONTHS)}/{rng.randint(2025, 2030)}"
+    }
+
+def label_lines(fields: Dict[str, str]) -> list:
+    return [
+        f"{fields['brand']} {fields['strength']}",
+        fields['company'],
+        f"BATCH: {fields['batch']}",
+        f"EXP: {fields['expiry']}"
+    ]
+
+def render_label(fields: Dict[str, str], rng: random.Random, size: Tuple[int, int] = (640, 320),
+                 noise: float = 8.0, blur: int = 1, max_rotation: float = 4.0) -> np.ndarray:
+    """Render label text onto a BGR image and degrade it like a phone photo"""
+    width, height = size
+    background = rng.randint(215, 255)
+    img = np.full((height, width, 3), background, dtype=np.uint8)
+    y = height // 5
+    step = (height - y) // len(label_lines(fields))
+    for i, line in enumerate(label_lines(fields)):
+        scale = 1.4 if i == 0 else 0.9
+        thickness = 3 if i == 0 else 2
+        cv2.putText(img, line, (rng.randint(15, 40), y + i * step), cv2.FONT_HERSHEY_SIMPLEX,
+                    scale, (rng.randint(0, 60),) * 3, thickness, cv2.LINE_AA)
+    return degrade(img, rng, noise=noise, blur=blur, max_rotation=max_rotation)
+
+def degrade(img: np.ndarray, rng: random.Random, noise: float = 8.0, blur: int = 1,
+            max_rotation: float = 4.0) -> np.ndarray:
+    """Apply rotation, blur and sensor noise"""
+    height, width = img.shape[:2]
+    background = int(img[0, 0, 0])
+    angle = rng.uniform(-max_rotation, max_rotation)
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    img = cv2.warpAffine(img, matrix, (width, height), borderValue=(background,) * 3)
+    if blur > 0:
+        k = 2 * blur + 1
+        img = cv2.GaussianBlur(img, (k, k), 0)
+    if noise > 0:
+        np_rng = np.random.default_rng(rng.randint(0, 2**32 - 1))
+        img = np.clip(img + np_rng.normal(0, noise, img.shape), 0, 255).astype(np.uint8)
+    return img
+
+def generate_labels(count: int, seed: int = 0, **render_kwargs):
+    """Yield ``count`` reproducible ``(image, fields)`` pairs"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        fields = random_label_fields(rng)
+        yield render_label(fields, rng, **render_kwargs), fields
+
+def encode_png(image: np.ndarray) -> bytes:
+    ok, buffer = cv2.imencode('.png', image)
+    if not ok:
+        raise ValueError("Failed to encode image")
+    return buffer.tobytes()
+
+def render_line(text: str, rng: random.Random, height: int = 64, **degrade_kwargs) -> np.ndarray:
+    """Render a single text line, the input shape TrOCR is trained on"""
+    scale, thickness = 1.2, 2
+    (w, h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+    img = np.full((height, w + 40, 3), 255, dtype=np.uint8)
+    cv2.putText(img, text, (20, (height + h) // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                scale, (rng.randint(0, 60),) * 3, thickness, cv2.LINE_AA)
+    return degrade(img, rng, **degrade_kwargs)
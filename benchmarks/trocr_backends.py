@@ -0,0 +1,81 @@
+"""Compare TrOCR inference backends on accuracy and latency.
+
+Example::
+
+    python -m benchmarks.trocr_backends --backends eager quantized onnx \\
+        --lines 30 --max-length 64 --output trocr_backends.json
+
+Each backend transcribes the same synthetic single-line label crops; accuracy
+is reported as exact-match rate and mean character similarity to the rendered
+text.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from fuzzywuzzy import fuzz
+
+from benchmarks.run import summarize
+from benchmarks.synthetic import generate_labels, label_lines, render_line
+
+def synthetic_lines(count: int, seed: int):
+    rng = random.Random(seed + 1)
+    for _, fields in generate_labels(count, seed=seed, size=(320, 160)):
+        text = rng.choice(label_lines(fields))
+        yield render_line(text, rng), text
+
+def benchmark_backend(backend: str, lines: list, max_length: int, num_beams: int) -> dict:
+    from app.services.ocr_service import OCRService
+
+    start = time.perf_counter()
+    ocr = OCRService(backend=backend, max_length=max_length, num_beams=num_beams)
+    load_s = time.perf_counter() - start
+    if not ocr.trocr_available:
+        return {'available': False}
+    ocr.trocr_ocr(lines[0][0])  # warm-up, not counted
+
+    samples, exact, similarity = [], 0, 0
+    for image, truth in lines:
+        start = time.perf_counter()
+        text = ocr.trocr_ocr(image)['text']
+        samples.append(time.perf_counter() - start)
+        exact += text.upper() == truth.upper()
+        similarity += fuzz.ratio(text.upper(), truth.upper()) / 100
+    return {
+        'available': True,
+        'backend': ocr.trocr_backend,
+        'load_s': load_s,
+        **summarize(samples),
+        'exact_match': exact / len(lines),
+        'char_similarity': similarity / len(lines)
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backends', nargs='+', default=['eager', 'quantized', 'onnx'])
+    parser.add_argument('--lines', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-length', type=int, default=64)
+    parser.add_argument('--num-beams', type=int, default=1)
+    parser.add_argument('--output', default='trocr_backends.json')
+    args = parser.parse_args(argv)
+
+    lines = list(synthetic_lines(args.lines, args.seed))
+    report = {'args': vars(args), 'backends': {}}
+    print(f"{'backend':10s} {'p50 ms':>9s} {'p95 ms':>9s} {'exact':>6s} {'similar':>8s}")
+    for backend in args.backends:
+        result = benchmark_backend(backend, lines, args.max_length, args.num_beams)
+        report['backends'][backend] = result
+        if result['available']:
+            print(f"{backend:10s} {result['p50_ms']:9.1f} {result['p95_ms']:9.1f} "
+                  f"{result['exact_match']:6.2f} {result['char_similarity']:8.2f}")
+        else:
+            print(f"{backend:10s} unavailable")
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+import pytest
+
+@pytest.fixture(autouse=True)
+def isolated_shared_cache(tmp_path, monkeypatch):
+    """Point the process-wide lookup cache at a per-test file so tests never
+    read or write ./data/cache in the working tree"""
+    from app.utils.shared_cache import shared_cache
+    path = str(tmp_path / "lookup.sqlite")
+    monkeypatch.setenv("SHARED_CACHE_PATH", path)
+    monkeypatch.setattr(shared_cache, "path", path)
+    return shared_cache
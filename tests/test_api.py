@@ -40,3 +40,23 @@ def test_invalid_image():
     )
     
     assert response.status_code == 400
+
+def test_profiler_requires_admin_token():
+    """Profiler endpoints are admin-only"""
+    response = client.get("/api/v1/admin/profiler")
+    assert response.status_code == 403
+
+def test_sources_health():
+    """Upstream breaker state is exposed per source"""
+    response = client.get("/api/v1/sources/health")
+    assert response.status_code == 200
+    assert set(response.json()) == {"openfda", "rxnorm", "drugbank"}
+
+def test_stream_websocket_acks_frames():
+    """Streaming endpoint acknowledges every frame"""
+    with client.websocket_connect("/api/v1/stream") as ws:
+        ws.send_bytes(b"not an image")
+        ack = ws.receive_json()
+        assert ack["type"] == "frame"
+        assert ack["accepted"] is False
+        assert ack["reason"] == "invalid_image"
@@ -0,0 +1,53 @@
+import signal
+import pytest
+from app import server
+
+def test_threads_per_worker():
+    assert server.threads_per_worker(4, cpu_count=8) == 2
+    assert server.threads_per_worker(3, cpu_count=8) == 2
+    assert server.threads_per_worker(16, cpu_count=8) == 1
+    assert server.threads_per_worker(0, cpu_count=8) == 8
+
+def test_restart_delay_backs_off():
+    assert [server.restart_delay(n) for n in range(1, 9)] == [1, 2, 4, 8, 16, 32, 60, 60]
+
+class TestSupervise:
+    @pytest.fixture
+    def fake_workers(self, monkeypatch):
+        """Stub out fork/wait/kill: every spawned worker crashes immediately"""
+        state = {'spawned': [], 'sleeps': [], 'killed': [], 'on_sleep': None}
+
+        def spawn():
+            state['spawned'].append(1000 + len(state['spawned']))
+            return state['spawned'][-1]
+
+        def wait():
+            if not state['spawned']:
+                raise ChildProcessError
+            return state['spawned'][-1], 256
+
+        def sleep(seconds):
+            state['sleeps'].append(seconds)
+            if state['on_sleep']:
+                state['on_sleep']()
+
+        monkeypatch.setattr(server.os, 'wait', wait)
+        monkeypatch.setattr(server.os, 'kill', lambda pid, sig: state['killed'].append(pid))
+        monkeypatch.setattr(server.time, 'sleep', sleep)
+        state['spawn'] = spawn
+        return state
+
+    def test_gives_up_on_crash_loop(self, fake_workers):
+        args = server.parse_args(['--workers', '1', '--max-restarts', '2'])
+        handler = signal.getsignal(signal.SIGTERM)
+        assert server._supervise(fake_workers['spawn'], args) is True
+        assert len(fake_workers['spawned']) == 3  # first start plus two restarts
+        assert fake_workers['sleeps'] == [1, 2]
+        assert signal.getsignal(signal.SIGTERM) is handler
+
+    def test_no_respawn_after_sigterm_during_backoff(self, fake_workers):
+        args = server.parse_args(['--workers', '1'])
+        fake_workers['on_sleep'] = lambda: signal.getsignal(signal.SIGTERM)(signal.SIGTERM, None)
+        assert server._supervise(fake_workers['spawn'], args) is False
+        assert len(fake_workers['spawned']) == 1
+        assert fake_workers['sleeps'] == [1]
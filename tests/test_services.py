@@ -1,8 +1,18 @@
 import pytest
+import asyncio
+import json
+import tarfile
+import cv2
 import numpy as np
+from app.batch import iter_inputs, load_checkpoint, parse_args as parse_batch_args, run as run_batch
+from app.models.schemas import CounterfeitRisk, VerificationResult
+from app.services.database_service import DatabaseService, SourceHealth
 from app.services.ocr_service import OCRService
 from app.services.pharma_service import PharmaService
+from app.services.stream_service import StreamSession, TextMerger
 from app.services.verification_service import VerificationService
+from app.utils.shared_cache import SharedCache
+from benchmarks.stubs import RxNormStub, running_stubs
 
 @pytest.fixture
 def sample_image():
@@ -23,6 +33,42 @@ class TestOCRService:
         assert "confidence" in result
         assert "method" in result
 
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            OCRService(backend="tensorrt")
+
+    def test_encoder_cache_survives_beam_expansion(self):
+        class FakeTensor:
+            def __init__(self, array):
+                self.array = array
+            def numpy(self):
+                return self.array
+
+        class FakeModel:
+            encoder_calls = 0
+            def get_encoder(self):
+                def encode(pixel_values):
+                    FakeModel.encoder_calls += 1
+                    return dict(last_hidden_state=np.ones((1, 4)))
+                return encode
+            def generate(self, encoder_outputs, num_beams):
+                # like transformers, beam search expands the outputs in place
+                hidden = np.repeat(encoder_outputs['last_hidden_state'], num_beams, axis=0)
+                encoder_outputs['last_hidden_state'] = hidden
+                return hidden.shape[0]
+
+        ocr = OCRService(num_beams=3)
+        ocr.trocr_model = FakeModel()
+        pixels = FakeTensor(np.zeros((1, 3, 8, 8), dtype=np.float32))
+        for _ in range(3):
+            outputs = ocr._encode(pixels, reuse=True)
+            assert ocr.trocr_model.generate(outputs, ocr.num_beams) == 3
+        assert FakeModel.encoder_calls == 1
+        # without opting in nothing is hashed or kept
+        ocr._encode(pixels)
+        assert FakeModel.encoder_calls == 2
+        assert len(ocr._encoder_cache) == 1
+
 class TestPharmaService:
     def test_extract_info(self, sample_text):
         pharma = PharmaService()
@@ -45,3 +91,180 @@ class TestVerificationService:
         assert hasattr(result, 'is_authentic')
         assert hasattr(result, 'confidence_score')
         assert hasattr(result, 'risk_level')
+
+@pytest.mark.asyncio
+class TestDatabaseService:
+    async def test_universal_search_against_stubs(self):
+        async with running_stubs(latency_ms=1, jitter_ms=0) as stubs:
+            results = await DatabaseService(cache=SharedCache(enabled=False)).universal_search("Paracetamol")
+        assert len(results) == 3
+        assert all(stub.requests == 1 for stub in stubs.values())
+
+    async def test_complete_results_are_shared_through_cache(self, tmp_path):
+        path = str(tmp_path / "lookup.sqlite")
+        async with running_stubs(latency_ms=1, jitter_ms=0) as stubs:
+            first = await DatabaseService(cache=SharedCache(path=path)).universal_search("Aspirin")
+            # a second service (as in another worker) reads the same store
+            second = await DatabaseService(cache=SharedCache(path=path)).universal_search("Aspirin")
+        assert first == second
+        assert all(stub.requests == 1 for stub in stubs.values())
+
+    async def test_cache_keys_follow_configured_sources(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("DRUGBANK_API_KEY", "")  # DrugBank not configured yet
+        db = DatabaseService(cache=SharedCache(path=str(tmp_path / "lookup.sqlite")))
+        async with running_stubs(latency_ms=1, jitter_ms=0) as stubs:
+            without_drugbank = await db.universal_search("Aspirin")
+            monkeypatch.setenv("DRUGBANK_API_KEY", "stub")
+            with_drugbank = await db.universal_search("Aspirin")
+        assert len(without_drugbank) == 2
+        assert len(with_drugbank) == 3
+        assert stubs["drugbank"].requests == 1
+
+    async def test_circuit_breaker_skips_failing_source(self):
+        db = DatabaseService(failure_threshold=2, cache=SharedCache(enabled=False))
+        async with running_stubs(latency_ms=1, jitter_ms=0, error_rate=1.0) as stubs:
+            for _ in range(4):
+                assert await db.universal_search("Paracetamol") == []
+        assert stubs["openfda"].requests == 2
+        assert db.health["openfda"].state == SourceHealth.OPEN
+        assert db.health_snapshot()["openfda"]["skipped"] == 2
+
+    async def test_cancelled_probe_releases_half_open_breaker(self):
+        db = DatabaseService(failure_threshold=1, cooldown=0.0, cache=SharedCache(enabled=False))
+        health = db.health["rxnorm"]
+        health.record_failure(RuntimeError("down"))
+        assert health.state == SourceHealth.HALF_OPEN
+        async with running_stubs(latency_ms=1000, jitter_ms=0):
+            probe = asyncio.create_task(db._search_source("rxnorm", "Paracetamol", None))
+            await asyncio.sleep(0.05)
+            assert health.probing
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+        assert not health.probing
+        assert health.allow()
+
+    async def test_rate_limit_respects_retry_after(self, monkeypatch):
+        stub = RxNormStub("rxnorm", latency_ms=1, jitter_ms=0, error_rate=1.0, error_status=429)
+        monkeypatch.setenv("RXNORM_URL", await stub.start())
+        try:
+            db = DatabaseService(cache=SharedCache(enabled=False))
+            await db._search_source("rxnorm", "Paracetamol", None)
+            await db._search_source("rxnorm", "Paracetamol", None)
+        finally:
+            await stub.stop()
+        assert stub.requests == 1
+        health = db.health_snapshot()["rxnorm"]
+        assert health["state"] == SourceHealth.OPEN
+        assert health["rate_limited"] == 1
+        assert health["retry_in_s"] > 50
+
+def encode_label(image, text="DOLO 650"):
+    label = image.copy()
+    cv2.putText(label, text, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+    return cv2.imencode(".png", label)[1].tobytes()
+
+class FakeOCR:
+    async def extract_text(self, image, reuse_encoder=False):
+        return {"text": "PARACETAMOL 500mg BATCH: AB123", "confidence": 1.0, "method": "fake"}
+
+class FakeVerifier:
+    async def verify(self, extracted):
+        return VerificationResult(is_authentic=False, confidence_score=0, risk_level=CounterfeitRisk.UNKNOWN,
+                                  matches_found=0, verification_details={})
+
+class TestStreamSession:
+    def test_text_merger_votes_between_variants(self):
+        merger = TextMerger()
+        merger.add("PARACETAM0L 500mg\nBATCH: AB123")
+        merger.add("PARACETAMOL 500mg BATCH: AB123 smudge")
+        merger.add("PARACETAMOL 500mg")
+        assert merger.text == "PARACETAMOL 500mg BATCH: AB123 smudge"
+
+    def test_text_merger_keeps_parts_from_different_frames(self):
+        merger = TextMerger()
+        merger.add("PARACETAMOL 500mg CIPLA")
+        merger.add("BATCH: AB1234 EXP: 12/2026")
+        assert merger.text == "PARACETAMOL 500mg CIPLA BATCH: AB1234 EXP: 12/2026"
+
+    @pytest.mark.asyncio
+    async def test_frame_selection(self, sample_image):
+        session = StreamSession(None, None, None)
+        frame = encode_label(sample_image)
+        assert (await session.submit(frame)).accepted
+        assert (await session.submit(frame)).reason == "sharper_frame_pending"
+        assert (await session.submit(cv2.imencode(".png", sample_image)[1].tobytes())).reason == "blurry"
+        assert (await session.submit(b"not an image")).reason == "invalid_image"
+        assert session.budget.snapshot()["stage_counts"]["preprocess"] >= 4
+
+    @pytest.mark.asyncio
+    async def test_steady_camera_becomes_stable(self, sample_image):
+        session = StreamSession(FakeOCR(), PharmaService(), FakeVerifier(), stable_updates=2, recheck_after=3)
+        frame = encode_label(sample_image)
+        assert (await session.submit(frame)).accepted
+        updates = [await session.next_update()]
+        reasons = []
+        for _ in range(20):
+            ack = await session.submit(frame)
+            reasons.append(ack.reason)
+            if ack.accepted:
+                updates.append(await session.next_update())
+        assert reasons[:3] == ["duplicate", "duplicate", None]
+        assert [u.stable for u in updates if u is not None] == [False, True]
+        # once stable, a still camera no longer triggers OCR
+        assert session.frames_processed == 3
+        assert reasons[-1] == "duplicate"
+
+class TestBatch:
+    def test_iter_inputs_directory_and_tar(self, tmp_path):
+        scans = tmp_path / "scans"
+        (scans / "sub").mkdir(parents=True)
+        (scans / "a.txt").write_text("PARACETAMOL 500mg")
+        (scans / "sub" / "b.png").write_bytes(b"png")
+        (scans / "notes.csv").write_text("ignored")
+        with tarfile.open(tmp_path / "scans.tar.gz", "w:gz") as archive:
+            archive.add(scans, arcname=".")
+
+        from_dir = list(iter_inputs(str(scans)))
+        from_tar = sorted(iter_inputs(str(tmp_path / "scans.tar.gz")))
+        assert from_dir == [("a.txt", "text", b"PARACETAMOL 500mg"), ("sub/b.png", "image", b"png")]
+        assert from_tar == from_dir
+
+    def test_checkpoint_drops_torn_line(self, tmp_path):
+        output = tmp_path / "results.jsonl"
+        output.write_text('{"id": "a.txt"}\n{"id": "b.png"}\n{"id": "c.p')
+        assert load_checkpoint(str(output)) == {"a.txt", "b.png"}
+        assert output.read_text().endswith('"b.png"}\n')
+
+    def test_checkpoint_retries_errors_and_unterminated_line(self, tmp_path):
+        output = tmp_path / "results.jsonl"
+        output.write_text('{"id": "a.txt"}\n{"id": "b.png", "error": "ValueError: Invalid image"}\n'
+                          '{"id": "d.png"}\n{"id": "d.png", "error": "TimeoutError: "}\n{"id": "c.png"}')
+        assert load_checkpoint(str(output)) == {"a.txt"}
+        assert output.read_text().endswith('TimeoutError: "}\n')
+
+    def test_checkpoint_rejects_foreign_file(self, tmp_path):
+        output = tmp_path / "results.jsonl"
+        content = '{"name": "PARACETAMOL"}\n{"name": "ASPIRIN"}\n'
+        output.write_text(content)
+        with pytest.raises(ValueError):
+            load_checkpoint(str(output))
+        assert output.read_text() == content
+
+    def test_run_resumes_from_checkpoint(self, tmp_path):
+        scans = tmp_path / "scans"
+        scans.mkdir()
+        for i in range(3):
+            (scans / f"label{i}.txt").write_text(f"PARACETAMOL 500mg BATCH: AB12{i}")
+        output = tmp_path / "results.jsonl"
+        argv = [str(scans), "--output", str(output), "--no-verify", "--no-fork", "--workers", "1"]
+
+        first = run_batch(parse_batch_args(argv))
+        assert (first["processed"], first["skipped"], first["errors"]) == (3, 0, 0)
+        (scans / "label3.txt").write_text("ASPIRIN 100mg")
+        second = run_batch(parse_batch_args(argv))
+        assert (second["processed"], second["skipped"], second["errors"]) == (1, 3, 0)
+
+        records = [json.loads(line) for line in output.read_text().splitlines()]
+        assert sorted(r["id"] for r in records) == [f"label{i}.txt" for i in range(4)]
+        assert all(r["extracted"]["medicine_names"] for r in records)
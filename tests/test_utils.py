@@ -1,3 +1,4 @@
+import os
 import numpy as np
 from app.utils.image_utils import preprocess_image, analyze_image_quality
 from app.utils.text_utils import (
@@ -48,3 +49,178 @@ class TestTextUtils:
         assert len(matches) > 0
         assert matches[0][0] == "PARACETAMOL"
         assert matches[0][1] == 100
+
+class TestSamplingProfiler:
+    def test_collects_collapsed_stacks(self):
+        import time
+        from app.utils.profiler import SamplingProfiler
+        profiler = SamplingProfiler(interval=0.001)
+        profile_id = profiler.start()
+        deadline = time.time() + 0.05
+        while time.time() < deadline:
+            sum(range(1000))
+        stacks = profiler.stop(profile_id)
+        assert sum(stacks.values()) > 0
+        assert "test_collects_collapsed_stacks" in profiler.collapsed(profile_id)
+        assert profiler.collapsed() == profiler.collapsed(profile_id)
+
+    def test_excludes_other_tasks_on_the_event_loop(self):
+        import asyncio, time
+        from app.utils.profiler import SamplingProfiler
+        profiler = SamplingProfiler(interval=0.001)
+
+        def profiled_work():
+            deadline = time.time() + 0.03
+            while time.time() < deadline:
+                sum(range(1000))
+
+        def unrelated_work():
+            deadline = time.time() + 0.03
+            while time.time() < deadline:
+                sum(range(1000))
+
+        async def profiled():
+            profile_id = profiler.start()
+            profiled_work()
+            await asyncio.sleep(0.05)  # the other task runs meanwhile
+            profiler.stop(profile_id)
+            return profile_id
+
+        async def other():
+            await asyncio.sleep(0)
+            unrelated_work()
+
+        async def main():
+            return (await asyncio.gather(profiled(), other()))[0]
+
+        stacks = profiler.collapsed(asyncio.run(main()))
+        assert "profiled_work" in stacks
+        assert "unrelated_work" not in stacks
+
+    def test_sample_every(self):
+        from app.utils.profiler import SamplingProfiler
+        profiler = SamplingProfiler(sample_every=3)
+        assert [profiler.should_sample() for _ in range(6)] == [False, False, True] * 2
+
+class TestCPUBudget:
+    def test_modes_follow_request_load(self):
+        from app.utils.cpu_budget import CPUBudget
+        budget = CPUBudget(cores=8, low_latency_requests=2)
+        with budget.request():
+            assert budget.mode == "low_latency"
+            with budget.stage("trocr") as threads:
+                assert threads == 8
+        with budget.request(), budget.request(), budget.request():
+            assert budget.mode == "throughput"
+            with budget.stage("trocr") as threads:
+                assert threads == 1
+
+    def test_caps_concurrent_stages(self):
+        import threading, time
+        from app.utils.cpu_budget import CPUBudget
+        budget = CPUBudget(cores=2, low_latency_requests=1)
+        peak, running, lock = [0], [0], threading.Lock()
+
+        def work():
+            with budget.request(), budget.request(), budget.stage("preprocess"):
+                with lock:
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+                time.sleep(0.01)
+                with lock:
+                    running[0] -= 1
+
+        workers = [threading.Thread(target=work) for _ in range(8)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        assert peak[0] <= 2
+        assert budget.snapshot()["slots_in_use"] == 0
+
+    def test_process_wide_stages_reserve_applied_limit(self, monkeypatch):
+        from contextlib import ExitStack
+        from app.utils.cpu_budget import CPUBudget
+        monkeypatch.setenv("OMP_THREAD_LIMIT", "")
+        budget = CPUBudget(cores=8, low_latency_requests=4)
+        for requests, mode in ((1, "low_latency"), (6, "throughput")):
+            with ExitStack() as stack:
+                for _ in range(requests):
+                    stack.enter_context(budget.request())
+                assert budget.mode == mode
+                with budget.stage("tesseract"):
+                    limit = int(os.environ["OMP_THREAD_LIMIT"])
+                    assert budget.snapshot()["slots_in_use"] == limit == 2
+
+    def test_thread_settings_applied_per_stage_thread(self, monkeypatch):
+        import sys, threading, types
+        from app.utils.cpu_budget import CPUBudget
+        applied = {}
+        fake_torch = types.SimpleNamespace(
+            set_num_threads=lambda n: applied.__setitem__(threading.get_ident(), n))
+        monkeypatch.setitem(sys.modules, "torch", fake_torch)
+        monkeypatch.setenv("OMP_THREAD_LIMIT", "")
+        budget = CPUBudget(cores=4, low_latency_requests=2)
+        granted = {}
+
+        def work():
+            with budget.request(), budget.stage("trocr") as threads:
+                granted[threading.get_ident()] = threads
+
+        for _ in range(2):  # same budget, different threads
+            worker = threading.Thread(target=work)
+            worker.start()
+            worker.join()
+        assert len(granted) == 2
+        assert applied == granted
+        # process-wide knobs are fixed, not resized per stage
+        assert os.environ["OMP_THREAD_LIMIT"] == str(budget.global_threads) == "2"
+
+class TestSharedCache:
+    def test_set_get_and_ttl(self, tmp_path):
+        from app.utils.shared_cache import SharedCache
+        cache = SharedCache(path=str(tmp_path / "cache.sqlite"))
+        cache.set("db:aspirin", [{"name": "Aspirin"}])
+        cache.set("short", 1, ttl=0.01)
+        assert cache.get("db:aspirin") == [{"name": "Aspirin"}]
+        import time
+        time.sleep(0.02)
+        assert cache.get("short") is None
+        assert cache.compact() == 1
+
+    def test_visible_across_processes(self, tmp_path):
+        import multiprocessing
+        from app.utils.shared_cache import SharedCache
+        path = str(tmp_path / "cache.sqlite")
+        cache = SharedCache(path=path)
+        assert cache.get("warm") is None
+        proc = multiprocessing.get_context("fork").Process(target=SharedCache(path=path).set, args=("warm", 42))
+        proc.start()
+        proc.join()
+        assert cache.get("warm") == 42
+
+    def test_compaction_bounds_size(self, tmp_path):
+        from app.utils.shared_cache import SharedCache
+        cache = SharedCache(path=str(tmp_path / "cache.sqlite"), max_bytes=1000)
+        for i in range(50):
+            cache.set(f"key{i}", "x" * 98)
+        cache.compact()
+        assert cache.snapshot()["bytes"] <= 1000
+        assert cache.get("key49") is not None
+        assert cache.get("key0") is None
+
+    def test_corrupt_row_is_a_miss(self, tmp_path):
+        from app.utils.shared_cache import SharedCache
+        cache = SharedCache(path=str(tmp_path / "cache.sqlite"))
+        cache.set("db:aspirin", [])
+        cache._conn().execute("UPDATE cache SET value = '{not json' WHERE key = 'db:aspirin'")
+        assert cache.get("db:aspirin") is None
+        assert cache.stats["errors"] == 1
+
+class TestFrameSignature:
+    def test_near_duplicates_are_close(self):
+        from app.utils.image_utils import frame_signature, signature_distance
+        img = np.tile(np.linspace(0, 255, 160, dtype=np.uint8), (120, 1))
+        noisy = np.clip(img.astype(int) + np.random.randint(-5, 5, img.shape), 0, 255).astype(np.uint8)
+        assert signature_distance(frame_signature(img), frame_signature(noisy)) <= 5
+        assert signature_distance(frame_signature(img), frame_signature(img[:, ::-1].copy())) > 5